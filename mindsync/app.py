@@ -1,17 +1,17 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import json
-import hashlib
-import urllib.parse
+from datetime import datetime
+import orjson
+import heapq
+from collections import Counter
+from operator import attrgetter
 
 # Import custom modules
 from src.calendar_parser import CalendarParser
-from src.models.calendar_event import CalendarEvent
-from src.google_calendar_api import GoogleCalendarAPI
+from src.google_calendar_api import GoogleCalendarAPI, clear_api_cache
 from src.auth.oauth_handler import GoogleOAuthHandler
+from src.auth.user_store import UserStore, MAX_PASSWORD_BYTES
+from src.utils import fast_digest
+from config.google_config import reset_credentials_cache
 
 # Page configuration
 st.set_page_config(
@@ -22,30 +22,47 @@ st.set_page_config(
 )
 
 # Initialize session state
-if 'authenticated' not in st.session_state:
-    st.session_state.authenticated = False
-if 'username' not in st.session_state:
-    st.session_state.username = None
-if 'calendar_provider' not in st.session_state:
-    st.session_state.calendar_provider = None
-if 'calendar_data' not in st.session_state:
-    st.session_state.calendar_data = None
-if 'parsed_events' not in st.session_state:
-    st.session_state.parsed_events = []
-if 'google_oauth_handler' not in st.session_state:
-    st.session_state.google_oauth_handler = GoogleOAuthHandler()
-if 'google_calendar_api' not in st.session_state:
-    st.session_state.google_calendar_api = GoogleCalendarAPI()
-
-# Simple user database (in production, use proper database)
-USER_DATABASE = {
-    "demo_user": "5e884898da28047151d0e56f8dc6292773603d0d6aabbdd62a11ef721d1542d8",  # "password"
-    "test_user": "ef92c9ae4b6b63c4c84d5ddaf8b4f0b6e1f6c9c5d2f8f7e8d1c9a5b4e6f3d2a1"   # "test123"
+SESSION_DEFAULTS = {
+    'authenticated': False,
+    'username': None,
+    'calendar_provider': None,
+    'calendar_data': None,
+    'parsed_events': [],
+    'upload_digest': None  # Digest of the last ingested upload, so reruns don't re-parse it
+}
+# Built only when missing, so existing handlers aren't re-instantiated on every rerun
+SESSION_FACTORIES = {
+    'google_oauth_handler': GoogleOAuthHandler,
+    'google_calendar_api': GoogleCalendarAPI
 }
 
-def hash_password(password):
-    """Simple password hashing"""
-    return hashlib.sha256(password.encode()).hexdigest()
+for key, value in SESSION_DEFAULTS.items():
+    st.session_state.setdefault(key, value)
+for key, factory in SESSION_FACTORIES.items():
+    if key not in st.session_state:
+        st.session_state[key] = factory()
+
+@st.cache_resource
+def get_user_store():
+    """Shared SQLite-backed account store (one per process)"""
+    return UserStore()
+
+@st.cache_data(ttl=600, max_entries=1024, show_spinner=False)
+def _verify_cached(username, password):
+    """
+    Check a username/password pair against the user store (successes memoized for 10 minutes)
+    Failures raise instead of returning False, so st.cache_data never stores them
+    """
+    if not get_user_store().verify_password(username, password):
+        raise PermissionError("Invalid username or password")
+    return True
+
+def _check_login(username, password):
+    """Return True if the username/password pair is valid"""
+    try:
+        return _verify_cached(username, password)
+    except PermissionError:
+        return False
 
 def main():
     # No need to handle OAuth callback in URL since we're using manual code entry
@@ -111,8 +128,8 @@ def show_auth_page():
                             st.session_state.calendar_provider = 'google'
                             st.session_state.google_user_info = user_info
                             
-                            # Initialize Google Calendar API
-                            st.session_state.google_calendar_api = GoogleCalendarAPI()
+                            # Rebind Google Calendar API to the new credentials
+                            st.session_state.google_calendar_api.reset()
                             
                             # Clear auth URL from session
                             del st.session_state.google_auth_url
@@ -149,9 +166,7 @@ def handle_login(username, password):
         st.error("Please enter both username and password")
         return
     
-    hashed_password = hash_password(password)
-    
-    if username in USER_DATABASE and USER_DATABASE[username] == hashed_password:
+    if _check_login(username, password):
         st.session_state.authenticated = True
         st.session_state.username = username
         st.success(f"Welcome back, {username}! 🎉")
@@ -173,12 +188,14 @@ def handle_signup(username, password, confirm_password):
         st.error("Password must be at least 6 characters long")
         return
     
-    if username in USER_DATABASE:
+    if len(password.encode()) > MAX_PASSWORD_BYTES:
+        st.error(f"Password must be at most {MAX_PASSWORD_BYTES} bytes long")
+        return
+    
+    if not get_user_store().create_user(username, password):
         st.error("Username already exists")
         return
     
-    # In a real app, you would save to a database
-    USER_DATABASE[username] = hash_password(password)
     st.session_state.authenticated = True
     st.session_state.username = username
     st.success(f"Account created successfully! Welcome, {username}! 🎉")
@@ -227,8 +244,8 @@ def show_calendar_provider_selection():
                                 st.session_state.calendar_provider = "google"
                                 st.session_state.google_user_info = user_info
                                 
-                                # Initialize Google Calendar API
-                                st.session_state.google_calendar_api = GoogleCalendarAPI()
+                                # Rebind Google Calendar API to the new credentials
+                                st.session_state.google_calendar_api.reset()
                                 
                                 # Load real calendar data
                                 load_real_google_calendar()
@@ -251,6 +268,61 @@ def show_calendar_provider_selection():
         if st.button("🚪 Logout", type="secondary"):
             logout()
 
+def _to_datetime_index(times):
+    """Convert datetimes to a DatetimeIndex of wall-clock times (mixed UTC offsets can't share one index)"""
+    import pandas as pd
+    
+    return pd.to_datetime([t.replace(tzinfo=None) for t in times], cache=True)
+
+def _materialize(events):
+    """Precompute per-event columns and the preview table once per load"""
+    # Heavy imports are deferred so the login/auth pages start faster
+    import numpy as np
+    import pandas as pd
+    
+    n = len(events)
+    durations = np.fromiter((e.duration_minutes for e in events), dtype=np.int32, count=n)
+    return {
+        'events': events,
+        'durations': durations,
+        'is_meeting': np.fromiter((e.is_meeting for e in events), dtype=bool, count=n),
+        'type_counts': Counter(e.event_type for e in events),
+        'df': pd.DataFrame({
+            'Title': [e.title for e in events],
+            'Start': _to_datetime_index([e.start_time for e in events]).strftime('%Y-%m-%d %H:%M'),
+            'End': _to_datetime_index([e.end_time for e in events]).strftime('%Y-%m-%d %H:%M'),
+            'Duration (min)': durations,
+            'Type': [e.event_type for e in events],
+            'Participants': np.fromiter((e.participants for e in events), dtype=np.int32, count=n)
+        })
+    }
+
+def set_parsed_events(events):
+    """Store parsed events along with their precomputed summary frame"""
+    st.session_state.parsed_events = events
+    st.session_state.event_frame = _materialize(events)
+
+def get_event_frame(events):
+    """Return the summary frame for events, rebuilding it if it belongs to an older event list"""
+    frame = st.session_state.get('event_frame')
+    if frame is None or frame['events'] is not events:
+        frame = _materialize(events)
+        st.session_state.event_frame = frame
+    return frame
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _sync_cached(user_key, _google_api):
+    """
+    Sync Google Calendar data, cached per user for 5 minutes (_google_api is not hashed)
+    A failed sync raises, so only successful summaries are cached
+    """
+    return _google_api.sync_calendar_data()
+
+def _sync_cache_key():
+    """Per-user key for _sync_cached (digest of the Google account email), or None if unknown"""
+    user_email = (st.session_state.get('google_user_info') or {}).get('email')
+    return fast_digest(user_email.encode()) if user_email else None
+
 def load_real_google_calendar():
     """Load real Google Calendar data"""
     try:
@@ -261,22 +333,28 @@ def load_real_google_calendar():
             return
         
         with st.spinner("🔄 Syncing your Google Calendar..."):
-            # Sync calendar data
-            sync_summary = google_api.sync_calendar_data()
+            # Sync calendar data (reruns within the TTL reuse the last sync for this user)
+            user_key = _sync_cache_key()
+            try:
+                if user_key:
+                    sync_summary = _sync_cached(user_key, google_api)
+                else:
+                    sync_summary = google_api.sync_calendar_data()
+            except Exception:
+                # The API client already reported the error; keep whatever was loaded before
+                return
             
             if sync_summary and 'events' in sync_summary:
                 events = sync_summary['events']
-                st.session_state.parsed_events = events
-                st.session_state.calendar_data = {
-                    'events': [event.to_dict() for event in events],
-                    'sync_summary': sync_summary
-                }
+                set_parsed_events(events)
+                # Pages read parsed_events directly, so the events aren't also kept as dicts
+                st.session_state.calendar_data = {'sync_summary': sync_summary}
                 
                 st.success(f"✅ Successfully connected to Google Calendar! Loaded {len(events)} events.")
             else:
                 st.warning("No events found in your Google Calendar for the next 7 days.")
-                st.session_state.parsed_events = []
-                st.session_state.calendar_data = {'events': []}
+                set_parsed_events([])
+                st.session_state.calendar_data = {'sync_summary': sync_summary}
         
     except Exception as e:
         st.error(f"❌ Error loading Google Calendar data: {str(e)}")
@@ -284,6 +362,13 @@ def load_real_google_calendar():
         st.warning("Falling back to sample data...")
         load_calendar_data("google")
 
+@st.cache_data(ttl=3600, show_spinner=False)
+def _load_and_parse(path):
+    """Read a calendar JSON file and parse its events (cached per path)"""
+    with open(path, 'rb') as f:
+        calendar_data = orjson.loads(f.read())
+    return calendar_data, CalendarParser().parse_calendar(calendar_data)
+
 def load_calendar_data(provider):
     """Load calendar data based on provider (fallback for sample data)"""
     try:
@@ -291,28 +376,20 @@ def load_calendar_data(provider):
         if provider == "google":
             sample_file = "data/sample_calendars/google_sample.json"
             try:
-                with open(sample_file, 'r') as f:
-                    calendar_data = json.load(f)
+                calendar_data, events = _load_and_parse(sample_file)
             except FileNotFoundError:
                 # Fallback to mixed_day sample
-                with open("data/sample_calendars/mixed_day.json", 'r') as f:
-                    calendar_data = json.load(f)
+                calendar_data, events = _load_and_parse("data/sample_calendars/mixed_day.json")
         elif provider == "outlook":
             sample_file = "data/sample_calendars/outlook_sample.json"
             try:
-                with open(sample_file, 'r') as f:
-                    calendar_data = json.load(f)
+                calendar_data, events = _load_and_parse(sample_file)
             except FileNotFoundError:
                 # Fallback to busy_day sample
-                with open("data/sample_calendars/busy_day.json", 'r') as f:
-                    calendar_data = json.load(f)
+                calendar_data, events = _load_and_parse("data/sample_calendars/busy_day.json")
         
         st.session_state.calendar_data = calendar_data
-        
-        # Parse calendar events
-        parser = CalendarParser()
-        events = parser.parse_calendar(calendar_data)
-        st.session_state.parsed_events = events
+        set_parsed_events(events)
         
         st.success(f"✅ Successfully connected to {provider.title()} Calendar! Loaded {len(events)} events (sample data).")
         
@@ -324,6 +401,7 @@ def logout():
     # Clear Google OAuth session
     if hasattr(st.session_state, 'google_oauth_handler'):
         st.session_state.google_oauth_handler.logout()
+    reset_credentials_cache()
     
     # Clear all session state
     st.session_state.authenticated = False
@@ -331,10 +409,12 @@ def logout():
     st.session_state.calendar_provider = None
     st.session_state.calendar_data = None
     st.session_state.parsed_events = []
+    st.session_state.event_frame = None
+    st.session_state.upload_digest = None
     
-    # Reinitialize handlers
-    st.session_state.google_oauth_handler = GoogleOAuthHandler()
-    st.session_state.google_calendar_api = GoogleCalendarAPI()
+    # Reset handlers in place (they hold per-user state, so they aren't shared across sessions)
+    if hasattr(st.session_state, 'google_calendar_api'):
+        st.session_state.google_calendar_api.reset()
     
     st.rerun()
 
@@ -380,6 +460,12 @@ def show_main_app():
     with col1:
         if st.button("🔄 Sync Calendar", help="Refresh calendar data"):
             if st.session_state.calendar_provider == "google":
+                # Explicit refresh bypasses this user's sync and API response caches
+                google_api = st.session_state.google_calendar_api
+                user_key = _sync_cache_key()
+                if user_key:
+                    _sync_cached.clear(user_key, google_api)
+                clear_api_cache(google_api)
                 load_real_google_calendar()
             else:
                 load_calendar_data(st.session_state.calendar_provider)
@@ -400,6 +486,22 @@ def show_main_app():
     elif page == "📈 Analytics":
         analytics_page()
 
+def _dashboard_metrics(frame):
+    """Scalar dashboard metrics, computed once per event frame and reused on later reruns"""
+    metrics = frame.get('metrics')
+    if metrics is None:
+        durations = frame['durations']
+        total_duration = int(durations.sum())
+        metrics = {
+            'total_duration': total_duration,
+            'meetings': int(frame['is_meeting'].sum()),
+            'focus_time': frame['type_counts']['focus_time'],
+            'avg_duration': total_duration / len(durations) if len(durations) else 0,
+            'longest_index': int(durations.argmax()) if len(durations) else None
+        }
+        frame['metrics'] = metrics
+    return metrics
+
 def dashboard_page():
     """Main dashboard with overview"""
     st.header("📊 Dashboard Overview")
@@ -417,20 +519,18 @@ def dashboard_page():
         return
     
     events = st.session_state.parsed_events
+    metrics = _dashboard_metrics(get_event_frame(events))
     
     # Key metrics
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.metric("📅 Total Events", len(events))
     with col2:
-        total_duration = sum(event.duration_minutes for event in events)
-        st.metric("⏱️ Total Duration", f"{total_duration} min")
+        st.metric("⏱️ Total Duration", f"{metrics['total_duration']} min")
     with col3:
-        meetings = len([e for e in events if e.is_meeting])
-        st.metric("🤝 Meetings", meetings)
+        st.metric("🤝 Meetings", metrics['meetings'])
     with col4:
-        focus_time = len([e for e in events if e.event_type == 'focus_time'])
-        st.metric("🎯 Focus Blocks", focus_time)
+        st.metric("🎯 Focus Blocks", metrics['focus_time'])
     
     st.markdown("---")
     
@@ -448,19 +548,24 @@ def dashboard_page():
     with col1:
         st.subheader("📋 Upcoming Events")
         if events:
-            # Sort by start time and show next 5
-            upcoming_events = sorted(events, key=lambda x: x.start_time)[:5]
-            for event in upcoming_events:
-                if event.start_time >= datetime.now():
-                    st.markdown(f"**{event.start_time.strftime('%H:%M')}** - {event.title}")
-                    st.caption(f"{event.duration_minutes} min • {event.event_type}")
+            # Show the next 5 events that haven't started yet
+            now = datetime.now()
+            upcoming_events = heapq.nsmallest(
+                5,
+                (e for e in events if e.start_time >= now),
+                key=attrgetter('start_time')
+            )
+            labels = _to_datetime_index([e.start_time for e in upcoming_events]).strftime('%H:%M')
+            for label, event in zip(labels, upcoming_events):
+                st.markdown(f"**{label}** - {event.title}")
+                st.caption(f"{event.duration_minutes} min • {event.event_type}")
     
     with col2:
         st.subheader("⚡ Quick Stats")
-        avg_duration = total_duration / len(events) if events else 0
-        st.metric("Average Event Duration", f"{avg_duration:.1f} min")
+        st.metric("Average Event Duration", f"{metrics['avg_duration']:.1f} min")
         
-        longest_event = max(events, key=lambda x: x.duration_minutes) if events else None
+        longest_index = metrics['longest_index']
+        longest_event = events[longest_index] if longest_index is not None else None
         if longest_event:
             st.metric("Longest Event", f"{longest_event.duration_minutes} min")
             st.caption(f"Event: {longest_event.title}")
@@ -521,20 +626,27 @@ def calendar_data_page():
         help="Upload a JSON file containing your calendar events"
     )
     
-    if uploaded_file is not None:
-        try:
-            calendar_data = json.load(uploaded_file)
-            st.session_state.calendar_data = calendar_data
-            
-            # Parse calendar events
-            parser = CalendarParser()
-            events = parser.parse_calendar(calendar_data)
-            st.session_state.parsed_events = events
-            
-            st.success(f"✅ Successfully loaded {len(events)} events!")
-            
-        except Exception as e:
-            st.error(f"❌ Error loading calendar: {str(e)}")
+    if uploaded_file is None:
+        st.session_state.upload_digest = None
+    else:
+        # The uploader returns the file on every rerun; only re-ingest when its contents change
+        raw = uploaded_file.getvalue()
+        upload_digest = fast_digest(raw)
+        if upload_digest != st.session_state.upload_digest:
+            try:
+                calendar_data = orjson.loads(raw)
+                st.session_state.calendar_data = calendar_data
+                
+                # Parse calendar events
+                parser = CalendarParser()
+                events = parser.parse_calendar(calendar_data)
+                set_parsed_events(events)
+                st.session_state.upload_digest = upload_digest
+                
+                st.success(f"✅ Successfully loaded {len(events)} events!")
+                
+            except Exception as e:
+                st.error(f"❌ Error loading calendar: {str(e)}")
     
     # Display current data if available
     if st.session_state.parsed_events:
@@ -544,15 +656,10 @@ def calendar_data_page():
 def load_sample_calendar(sample_type):
     """Load predefined sample calendar data"""
     try:
-        with open(f"data/sample_calendars/{sample_type}.json", 'r') as f:
-            calendar_data = json.load(f)
+        calendar_data, events = _load_and_parse(f"data/sample_calendars/{sample_type}.json")
         
         st.session_state.calendar_data = calendar_data
-        
-        # Parse events
-        parser = CalendarParser()
-        events = parser.parse_calendar(calendar_data)
-        st.session_state.parsed_events = events
+        set_parsed_events(events)
         
         st.success(f"✅ Loaded {sample_type.replace('_', ' ')} sample with {len(events)} events!")
         
@@ -568,19 +675,8 @@ def display_calendar_preview(events):
     
     st.subheader("📊 Calendar Preview")
     
-    # Convert events to DataFrame for display
-    event_data = []
-    for event in events:
-        event_data.append({
-            'Title': event.title,
-            'Start': event.start_time.strftime('%Y-%m-%d %H:%M'),
-            'End': event.end_time.strftime('%Y-%m-%d %H:%M'),
-            'Duration (min)': event.duration_minutes,
-            'Type': event.event_type,
-            'Participants': event.participants
-        })
-    
-    df = pd.DataFrame(event_data)
+    # Table is precomputed when the events are loaded
+    df = get_event_frame(events)['df']
     
     # Display events table
     st.dataframe(df, use_container_width=True)
@@ -590,19 +686,32 @@ def display_calendar_preview(events):
         st.subheader("📅 Timeline View")
         create_timeline_chart(events)
 
+def _events_signature(events):
+    """Stable digest of the fields the timeline chart depends on"""
+    payload = orjson.dumps([
+        (event.title, event.start_time.isoformat(), event.end_time.isoformat(), event.event_type)
+        for event in events
+    ])
+    return fast_digest(payload)
+
 def create_timeline_chart(events):
     """Create a timeline visualization of events"""
-    # Prepare data for timeline
-    timeline_data = []
-    for event in events:
-        timeline_data.append({
-            'Task': event.title[:30] + "..." if len(event.title) > 30 else event.title,
-            'Start': event.start_time,
-            'Finish': event.end_time,
-            'Type': event.event_type
-        })
+    fig = _build_timeline_fig(_events_signature(events), events)
+    st.plotly_chart(fig, use_container_width=True)
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def _build_timeline_fig(signature, _events):
+    """Build the timeline figure; cached by signature (_events is not hashed)"""
+    import pandas as pd
+    import plotly.express as px
     
-    df_timeline = pd.DataFrame(timeline_data)
+    # Prepare data for timeline
+    df_timeline = pd.DataFrame({
+        'Task': [event.title[:30] + "..." if len(event.title) > 30 else event.title for event in _events],
+        'Start': [event.start_time for event in _events],
+        'Finish': [event.end_time for event in _events],
+        'Type': [event.event_type for event in _events]
+    })
     
     # Create Gantt chart
     fig = px.timeline(
@@ -615,7 +724,7 @@ def create_timeline_chart(events):
     )
     
     fig.update_layout(height=400)
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
 def stress_analysis_page():
     st.header("🔍 Stress Analysis")
@@ -4,6 +4,7 @@ Handles Google Calendar API settings and credentials
 """
 
 import os
+from functools import lru_cache
 import streamlit as st
 
 # Google Calendar API Configuration
@@ -23,35 +24,56 @@ CALENDAR_API_SERVICE_NAME = "calendar"
 CALENDAR_API_VERSION = "v3"
 PEOPLE_API_SERVICE_NAME = "people"
 PEOPLE_API_VERSION = "v1"
+HTTP_TIMEOUT_SECONDS = 30
+
+# Partial-response field masks (only what CalendarEvent / get_calendars actually read)
+EVENT_LIST_FIELDS = (
+    "nextPageToken,"
+    "items(id,summary,description,start,end,location,attendees/email,"
+    "organizer/email,conferenceData,status,recurringEventId)"
+)
+CALENDAR_LIST_FIELDS = (
+    "nextPageToken,"
+    "items(id,summary,description,primary,accessRole,selected,colorId,backgroundColor)"
+)
+
+@lru_cache(maxsize=1)
+def _load_google_credentials():
+    """
+    Read Google API credentials from Streamlit secrets or environment
+    Raises on failure, so lru_cache only ever holds a successful load
+    """
+    # Try to get from Streamlit secrets first
+    if hasattr(st, 'secrets'):
+        # Check for google_oauth section (Streamlit Cloud)
+        if 'google_oauth' in st.secrets:
+            return {
+                "client_id": st.secrets.google_oauth.client_id,
+                "client_secret": st.secrets.google_oauth.client_secret,
+                "api_key": st.secrets.google_oauth.get("api_key", "")
+            }
+        # Check for google section (local development)
+        elif 'google' in st.secrets:
+            return {
+                "client_id": st.secrets.google.client_id,
+                "client_secret": st.secrets.google.client_secret,
+                "api_key": st.secrets.google.api_key
+            }
+    
+    # Fallback to environment variables
+    return {
+        "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+        "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
+        "api_key": os.getenv("GOOGLE_API_KEY")
+    }
 
 def get_google_credentials():
     """
     Get Google API credentials from Streamlit secrets or environment
+    Cached per process; callers must not mutate the returned dict
     """
     try:
-        # Try to get from Streamlit secrets first
-        if hasattr(st, 'secrets'):
-            # Check for google_oauth section (Streamlit Cloud)
-            if 'google_oauth' in st.secrets:
-                return {
-                    "client_id": st.secrets.google_oauth.client_id,
-                    "client_secret": st.secrets.google_oauth.client_secret,
-                    "api_key": st.secrets.google_oauth.get("api_key", "")
-                }
-            # Check for google section (local development)
-            elif 'google' in st.secrets:
-                return {
-                    "client_id": st.secrets.google.client_id,
-                    "client_secret": st.secrets.google.client_secret,
-                    "api_key": st.secrets.google.api_key
-                }
-        
-        # Fallback to environment variables
-        return {
-            "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-            "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
-            "api_key": os.getenv("GOOGLE_API_KEY")
-        }
+        return _load_google_credentials()
     except Exception as e:
         st.error(f"Error loading Google credentials: {e}")
         return None
@@ -74,6 +96,12 @@ def get_oauth_config():
         }
     }
 
+def reset_credentials_cache():
+    """
+    Drop cached credentials so the next call re-reads secrets
+    """
+    _load_google_credentials.cache_clear()
+
 # Error Messages
 ERROR_MESSAGES = {
     "no_credentials": "❌ Google API credentials not found. Please check your configuration.",
@@ -5,23 +5,78 @@ Manages authentication flow, token storage, and refresh
 
 import os
 import json
+import tempfile
+import threading
 from datetime import datetime, timedelta
+from hmac import compare_digest
 from typing import Optional, Dict, Any
 
+import httplib2
 import streamlit as st
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 
+from src.utils import fast_digest
 from config.google_config import (
     GOOGLE_CALENDAR_SCOPES,
     TOKEN_FILE,
     CREDENTIALS_FILE,
+    PEOPLE_API_SERVICE_NAME,
+    PEOPLE_API_VERSION,
+    HTTP_TIMEOUT_SECONDS,
     ERROR_MESSAGES,
     SUCCESS_MESSAGES
 )
 
+def _build_people_service(credentials: Credentials, http: httplib2.Http):
+    """Build the People API service (used once per session; user info is then kept in session state)"""
+    return build(
+        PEOPLE_API_SERVICE_NAME,
+        PEOPLE_API_VERSION,
+        http=AuthorizedHttp(credentials, http=http),
+        static_discovery=True,
+        cache_discovery=False
+    )
+
+# One lock per refresh token: sessions sharing a token refresh one at a time, everyone else
+# is unaffected. Alongside it, the credentials each token last refreshed to, so a session
+# that waited on the lock reuses them instead of refreshing (and racing rotation) again.
+_refresh_locks: Dict[str, threading.Lock] = {}
+_refreshed_credentials: Dict[str, str] = {}
+_refresh_locks_guard = threading.Lock()
+
+def _refresh_lock_for(key: str) -> threading.Lock:
+    """Return the refresh lock for a refresh-token digest"""
+    with _refresh_locks_guard:
+        return _refresh_locks.setdefault(key, threading.Lock())
+
+def _secret_eq(a: Optional[str], b: Optional[str]) -> bool:
+    """Compare token/secret material in constant time"""
+    if a is None or b is None:
+        return a is b
+    return compare_digest(a.encode(), b.encode())
+
+def _write_token_file(serialized: str, path: str) -> bool:
+    """Atomically replace the token file; returns True if it was written"""
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as token:
+            token.write(serialized)
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        # The token file is a development convenience; session state is authoritative
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        return False
+
 class GoogleOAuthHandler:
     """
     Handles Google OAuth 2.0 authentication flow for Streamlit
@@ -30,6 +85,10 @@ class GoogleOAuthHandler:
     def __init__(self):
         self.scopes = GOOGLE_CALENDAR_SCOPES
         self.credentials = None
+        self._saved_credentials_json = None  # Last serialized credentials written to TOKEN_FILE
+        self._token_lock = threading.Lock()  # Serializes TOKEN_FILE writes and removal
+        self._token_generation = 0  # Bumped by each save and by logout; older writers skip their write
+        self._http = httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)  # Session-scoped keep-alive connection
     
     def is_authenticated(self) -> bool:
         """Check if user is currently authenticated"""
@@ -41,22 +100,16 @@ class GoogleOAuthHandler:
             return self.credentials
         
         # Try to load from session state
-        if 'google_credentials' in st.session_state:
+        ss = st.session_state
+        if 'google_credentials' in ss:
             try:
-                creds_data = st.session_state.google_credentials
-                self.credentials = Credentials(
-                    token=creds_data.get('token'),
-                    refresh_token=creds_data.get('refresh_token'),
-                    token_uri=creds_data.get('token_uri'),
-                    client_id=creds_data.get('client_id'),
-                    client_secret=creds_data.get('client_secret'),
-                    scopes=creds_data.get('scopes')
-                )
+                # Session holds the Credentials object itself, so nothing is rebuilt per rerun
+                self.credentials = ss.google_credentials
                 
-                # Check if credentials are expired and refresh if possible
-                if self.credentials.expired and self.credentials.refresh_token:
-                    self.credentials.refresh(Request())
+                # Only refresh once the access token is (about to be) expired
+                if self._refresh_if_expired():
                     self._save_credentials_to_session()
+                    self._save_credentials_to_file()
                 
                 if self.credentials.valid:
                     return self.credentials
@@ -68,8 +121,7 @@ class GoogleOAuthHandler:
         if os.path.exists(TOKEN_FILE):
             try:
                 self.credentials = Credentials.from_authorized_user_file(TOKEN_FILE, self.scopes)
-                if self.credentials and self.credentials.expired and self.credentials.refresh_token:
-                    self.credentials.refresh(Request())
+                if self._refresh_if_expired():
                     self._save_credentials_to_file()
                 
                 if self.credentials and self.credentials.valid:
@@ -80,6 +132,26 @@ class GoogleOAuthHandler:
         
         return None
     
+    def _refresh_if_expired(self) -> bool:
+        """Refresh expired credentials; returns True if self.credentials changed"""
+        credentials = self.credentials
+        if not (credentials and credentials.expired and credentials.refresh_token):
+            return False
+        
+        key = fast_digest(credentials.refresh_token.encode())
+        with _refresh_lock_for(key):
+            # Another session holding the same refresh token may have refreshed while we waited
+            latest = _refreshed_credentials.get(key)
+            if latest is not None:
+                reloaded = Credentials.from_authorized_user_info(json.loads(latest), self.scopes)
+                if reloaded.valid:
+                    self.credentials = reloaded
+                    return True
+            
+            credentials.refresh(Request())
+            _refreshed_credentials[key] = credentials.to_json()
+        return True
+    
     def get_auth_url(self) -> Optional[str]:
             """Generate OAuth authorization URL"""
             try:
@@ -128,12 +200,13 @@ class GoogleOAuthHandler:
     
     def handle_manual_auth_code(self, authorization_code: str) -> bool:
         """Handle manual authorization code entry"""
+        ss = st.session_state
         try:
-            if 'oauth_flow' not in st.session_state:
+            if 'oauth_flow' not in ss:
                 st.error("OAuth flow not found. Please try again.")
                 return False
             
-            flow = st.session_state.oauth_flow
+            flow = ss.oauth_flow
             
             # Fetch token using the authorization code
             flow.fetch_token(code=authorization_code)
@@ -143,10 +216,11 @@ class GoogleOAuthHandler:
             self._save_credentials_to_session()
             self._save_credentials_to_file()
             
-            # Get user info
+            # Get user info (the new token may belong to a different account, so don't reuse the old one)
+            ss.pop('google_user_info', None)
             user_info = self._get_user_info()
             if user_info:
-                st.session_state.google_user_info = user_info
+                ss.google_user_info = user_info
             
             st.success(SUCCESS_MESSAGES["auth_success"])
             return True
@@ -160,35 +234,41 @@ class GoogleOAuthHandler:
         self.credentials = None
         
         # Clear session state
-        if 'google_credentials' in st.session_state:
-            del st.session_state.google_credentials
-        if 'google_user_info' in st.session_state:
-            del st.session_state.google_user_info
-        if 'oauth_flow' in st.session_state:
-            del st.session_state.oauth_flow
+        ss = st.session_state
+        for key in ('google_credentials', 'google_user_info', 'oauth_flow'):
+            ss.pop(key, None)
         
-        # Remove token file
-        if os.path.exists(TOKEN_FILE):
-            os.remove(TOKEN_FILE)
+        # Remove token file; bumping the generation stops any pending writer from recreating it
+        with self._token_lock:
+            self._token_generation += 1
+            self._saved_credentials_json = None
+            if os.path.exists(TOKEN_FILE):
+                os.remove(TOKEN_FILE)
         
         st.success("Successfully logged out!")
     
     def get_user_info(self) -> Optional[Dict[str, Any]]:
         """Get authenticated user information"""
-        if 'google_user_info' in st.session_state:
-            return st.session_state.google_user_info
+        ss = st.session_state
+        if 'google_user_info' in ss:
+            return ss.google_user_info
         
         return self._get_user_info()
     
     def _get_user_info(self) -> Optional[Dict[str, Any]]:
         """Fetch user information from Google"""
+        # Already fetched for this session; skip the People API round-trip
+        ss = st.session_state
+        if 'google_user_info' in ss:
+            return ss.google_user_info
+        
         try:
             credentials = self.get_valid_credentials()
             if not credentials:
                 return None
             
             # Build People API service
-            service = build('people', 'v1', credentials=credentials)
+            service = _build_people_service(credentials, self._http)
             
             # Get user profile
             profile = service.people().get(
@@ -222,21 +302,36 @@ class GoogleOAuthHandler:
     def _save_credentials_to_session(self):
         """Save credentials to Streamlit session state"""
         if self.credentials:
-            st.session_state.google_credentials = {
-                'token': self.credentials.token,
-                'refresh_token': self.credentials.refresh_token,
-                'token_uri': self.credentials.token_uri,
-                'client_id': self.credentials.client_id,
-                'client_secret': self.credentials.client_secret,
-                'scopes': self.credentials.scopes
-            }
+            ss = st.session_state
+            ss.google_credentials = self.credentials
+            ss.setdefault('google_oauth_handler', self)
+    
+    def _write_token(self, serialized: str, generation: int):
+        """Write TOKEN_FILE (background thread); only a successful write is remembered for dedupe"""
+        with self._token_lock:
+            # A newer save or a logout happened since this write was queued
+            if generation != self._token_generation:
+                return
+            if _write_token_file(serialized, TOKEN_FILE):
+                self._saved_credentials_json = serialized
     
     def _save_credentials_to_file(self):
         """Save credentials to file for development"""
         if self.credentials:
             try:
-                with open(TOKEN_FILE, 'w') as token:
-                    token.write(self.credentials.to_json())
+                serialized = self.credentials.to_json()
+                
+                # Skip the write if token.json already holds these credentials
+                if _secret_eq(serialized, self._saved_credentials_json):
+                    return
+                
+                # Write off the script thread so disk latency doesn't block the rerun
+                self._token_generation += 1
+                threading.Thread(
+                    target=self._write_token,
+                    args=(serialized, self._token_generation),
+                    daemon=True
+                ).start()
             except Exception as e:
                 # Don't show error for file operations in production
 
@@ -0,0 +1,103 @@
+"""
+Local account storage for username/password logins
+Persists users and salted bcrypt password hashes in SQLite
+"""
+
+import hmac
+import sqlite3
+from contextlib import closing
+from typing import Optional
+
+import bcrypt
+
+USER_DB_FILE = "users.db"
+BCRYPT_ROUNDS = 10
+
+# bcrypt only accepts up to 72 bytes of input (bcrypt>=5 raises ValueError beyond that)
+MAX_PASSWORD_BYTES = 72
+
+# Demo accounts advertised on the login page
+DEMO_USERS = {
+    "demo_user": "password",
+    "test_user": "test123"
+}
+
+# Checked against when the username is unknown, so response time doesn't reveal which accounts exist
+_DUMMY_HASH = bcrypt.hashpw(b"dummy-password", bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+
+def _encode_password(password: str) -> bytes:
+    """Encode a password for bcrypt; raises ValueError if it is longer than MAX_PASSWORD_BYTES"""
+    encoded = password.encode()
+    if len(encoded) > MAX_PASSWORD_BYTES:
+        raise ValueError(f"Password cannot be longer than {MAX_PASSWORD_BYTES} bytes")
+    return encoded
+
+class UserStore:
+    """
+    SQLite-backed store for local user accounts
+    """
+    
+    def __init__(self, db_path: str = USER_DB_FILE):
+        self.db_path = db_path
+        self._initialize_db()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection (one per operation, so the store is thread-safe)"""
+        return sqlite3.connect(self.db_path, timeout=10)
+    
+    def _initialize_db(self):
+        """Create the users table and seed the demo accounts"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "username TEXT PRIMARY KEY, "
+                "pw_hash BLOB NOT NULL)"
+            )
+            
+            # OR IGNORE: several workers may seed the shared database at the same time
+            for username, password in DEMO_USERS.items():
+                conn.execute(
+                    "INSERT OR IGNORE INTO users (username, pw_hash) VALUES (?, ?)",
+                    (username, self._hash_password(password))
+                )
+    
+    @staticmethod
+    def _hash_password(password: str) -> bytes:
+        """Hash a password with a fresh per-user salt"""
+        return bcrypt.hashpw(_encode_password(password), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
+    
+    def get_password_hash(self, username: str) -> Optional[bytes]:
+        """Return the stored bcrypt hash for a user, or None if unknown"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT pw_hash FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def create_user(self, username: str, password: str) -> bool:
+        """Create a new account; returns False if the username already exists"""
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT INTO users (username, pw_hash) VALUES (?, ?)",
+                    (username, self._hash_password(password))
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+    
+    def verify_password(self, username: str, password: str) -> bool:
+        """Check a username/password pair against the stored hash"""
+        try:
+            encoded = _encode_password(password)
+        except ValueError:
+            # No account can have been created with an over-long password
+            return False
+        
+        pw_hash = self.get_password_hash(username)
+        expected = pw_hash if pw_hash is not None else _DUMMY_HASH
+        
+        # Always hash and compare in constant time, even for unknown usernames
+        candidate = bcrypt.hashpw(encoded, expected)
+        return hmac.compare_digest(candidate, expected) and pw_hash is not None
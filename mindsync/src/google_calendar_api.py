@@ -3,20 +3,77 @@ Google Calendar API Integration
 Handles real-time calendar data fetching and processing
 """
 
+import heapq
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
+import httplib2
 import streamlit as st
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from src.models.calendar_event import CalendarEvent
+from src.utils import fast_digest
 from config.google_config import (
     CALENDAR_API_SERVICE_NAME,
     CALENDAR_API_VERSION,
+    CALENDAR_LIST_FIELDS,
+    EVENT_LIST_FIELDS,
+    HTTP_TIMEOUT_SECONDS,
     ERROR_MESSAGES,
     SUCCESS_MESSAGES
 )
 
+def _to_rfc3339(value: datetime) -> str:
+    """Format a datetime for the API; naive values are treated as local time, not UTC"""
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.isoformat()
+
+def _build_calendar_service(credentials, http: httplib2.Http):
+    """Build the Calendar API service (kept on the session's GoogleCalendarAPI, so built once per login)"""
+    return build(
+        CALENDAR_API_SERVICE_NAME,
+        CALENDAR_API_VERSION,
+        http=AuthorizedHttp(credentials, http=http),
+        static_discovery=True,
+        cache_discovery=False
+    )
+
+# The cached fetchers call the raising _list_* methods: st.cache_data doesn't store
+# exceptions, so a failed request is retried on the next call instead of pinned for the TTL
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def _fetch_calendars(token_key: str, _api: 'GoogleCalendarAPI') -> List[Dict[str, Any]]:
+    """Calendar list, cached per user (calendars rarely change)"""
+    return _api._list_calendars()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _fetch_events(
+    token_key: str,
+    time_min_iso: str,
+    time_max_iso: str,
+    max_results: int,
+    _api: 'GoogleCalendarAPI'
+) -> List[CalendarEvent]:
+    """Primary-calendar events for a time range, cached per user for 5 minutes"""
+    return _api._list_events(
+        'primary',
+        datetime.fromisoformat(time_min_iso),
+        datetime.fromisoformat(time_max_iso),
+        max_results
+    )
+
+def clear_api_cache(api: 'GoogleCalendarAPI'):
+    """
+    Drop one user's cached calendar list and this week's events so the next call goes back to the API
+    Other users' entries are left alone
+    """
+    if api.cache_key is None:
+        return
+    _fetch_calendars.clear(api.cache_key, api)
+    _fetch_events.clear(api.cache_key, *api._week_fetch_args(datetime.now()), api)
+
 class GoogleCalendarAPI:
     """
     Google Calendar API client for fetching and managing calendar data
@@ -25,24 +82,30 @@ class GoogleCalendarAPI:
     def __init__(self):
         self.oauth_handler = None  # Will be set when needed
         self.service = None
+        self.cache_key = None  # Digest of the login's first access token; partitions cached responses per session user
+        self._http = httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)  # Session-scoped keep-alive connection
+    
+    def reset(self):
+        """Drop the bound OAuth handler and service so they are rebuilt on next use"""
+        self.oauth_handler = None
+        self.service = None
+        self.cache_key = None
     
     def _initialize_service(self):
         """Initialize Google Calendar API service"""
         try:
             if not self.oauth_handler:
                 # Get oauth handler from session state
-                if 'google_oauth_handler' in st.session_state:
-                    self.oauth_handler = st.session_state.google_oauth_handler
+                ss = st.session_state
+                if 'google_oauth_handler' in ss:
+                    self.oauth_handler = ss.google_oauth_handler
                 else:
                     return
             
             credentials = self.oauth_handler.get_valid_credentials()
             if credentials:
-                self.service = build(
-                    CALENDAR_API_SERVICE_NAME,
-                    CALENDAR_API_VERSION,
-                    credentials=credentials
-                )
+                self.service = _build_calendar_service(credentials, self._http)
+                self.cache_key = fast_digest(credentials.token.encode())
         except Exception as e:
             st.error(f"Error initializing Calendar API: {e}")
             self.service = None
@@ -59,23 +122,7 @@ class GoogleCalendarAPI:
             return []
         
         try:
-            calendar_list = self.service.calendarList().list().execute()
-            calendars = []
-            
-            for calendar_item in calendar_list.get('items', []):
-                calendars.append({
-                    'id': calendar_item['id'],
-                    'summary': calendar_item.get('summary', 'Unnamed Calendar'),
-                    'description': calendar_item.get('description', ''),
-                    'primary': calendar_item.get('primary', False),
-                    'access_role': calendar_item.get('accessRole', 'reader'),
-                    'selected': calendar_item.get('selected', True),
-                    'color_id': calendar_item.get('colorId', '1'),
-                    'background_color': calendar_item.get('backgroundColor', '#9FC6E7')
-                })
-            
-            return calendars
-            
+            return _fetch_calendars(self.cache_key, self)
         except HttpError as e:
             if e.resp.status == 403:
                 st.error(ERROR_MESSAGES["rate_limit"])
@@ -86,6 +133,25 @@ class GoogleCalendarAPI:
             st.error(f"Unexpected error: {e}")
             return []
     
+    def _list_calendars(self) -> List[Dict[str, Any]]:
+        """Fetch the calendar list from the API (uncached; raises on API errors)"""
+        calendar_list = self.service.calendarList().list(fields=CALENDAR_LIST_FIELDS).execute()
+        calendars = []
+        
+        for calendar_item in calendar_list.get('items', []):
+            calendars.append({
+                'id': calendar_item['id'],
+                'summary': calendar_item.get('summary', 'Unnamed Calendar'),
+                'description': calendar_item.get('description', ''),
+                'primary': calendar_item.get('primary', False),
+                'access_role': calendar_item.get('accessRole', 'reader'),
+                'selected': calendar_item.get('selected', True),
+                'color_id': calendar_item.get('colorId', '1'),
+                'background_color': calendar_item.get('backgroundColor', '#9FC6E7')
+            })
+        
+        return calendars
+    
     def get_events(
         self,
         calendar_id: str = 'primary',
@@ -93,7 +159,8 @@ class GoogleCalendarAPI:
         time_max: Optional[datetime] = None,
         max_results: int = 50,
         single_events: bool = True,
-        order_by: str = 'startTime'
+        order_by: str = 'startTime',
+        event_types: Optional[List[str]] = None
     ) -> List[CalendarEvent]:
         """
         Fetch events from Google Calendar
@@ -105,6 +172,7 @@ class GoogleCalendarAPI:
             max_results: Maximum number of events to fetch
             single_events: Whether to expand recurring events
             order_by: Sort order for events
+            event_types: Server-side eventType filter, e.g. ['focusTime'] (default: all types)
         
         Returns:
             List of CalendarEvent objects
@@ -113,60 +181,163 @@ class GoogleCalendarAPI:
             st.error("Not connected to Google Calendar")
             return []
         
+        # Set default time range if not provided
+        if time_min is None:
+            time_min = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        if time_max is None:
+            time_max = time_min + timedelta(days=7)  # Next 7 days
+        
         try:
-            # Set default time range if not provided
-            if time_min is None:
-                time_min = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            if time_max is None:
-                time_max = time_min + timedelta(days=7)  # Next 7 days
-            
-            # Convert to RFC3339 format
-            time_min_rfc = time_min.isoformat() + 'Z'
-            time_max_rfc = time_max.isoformat() + 'Z'
-            
-            # Fetch events from Google Calendar API
-            events_result = self.service.events().list(
-                calendarId=calendar_id,
-                timeMin=time_min_rfc,
-                timeMax=time_max_rfc,
-                maxResults=max_results,
-                singleEvents=single_events,
-                orderBy=order_by,
-                showDeleted=False
-            ).execute()
-            
-            events = events_result.get('items', [])
-            
-            if not events:
-                st.info(ERROR_MESSAGES["no_events"])
-                return []
-            
-            # Convert to CalendarEvent objects
-            calendar_events = []
-            for event in events:
-                try:
-                    calendar_event = CalendarEvent.from_google_calendar(event)
-                    calendar_events.append(calendar_event)
-                except Exception as e:
-                    st.warning(f"Error processing event '{event.get('summary', 'Unknown')}': {e}")
-                    continue
-            
-            st.success(f"{SUCCESS_MESSAGES['calendar_loaded']} Found {len(calendar_events)} events.")
-            return calendar_events
-            
-        except HttpError as e:
-            if e.resp.status == 403:
+            calendar_events = self._list_events(
+                calendar_id,
+                time_min,
+                time_max,
+                max_results,
+                single_events=single_events,
+                order_by=order_by,
+                event_types=event_types
+            )
+        except Exception as e:
+            self._report_events_error(e)
+            return []
+        
+        if not calendar_events:
+            st.info(ERROR_MESSAGES["no_events"])
+            return []
+        
+        st.success(f"{SUCCESS_MESSAGES['calendar_loaded']} Found {len(calendar_events)} events.")
+        return calendar_events
+    
+    def _list_events(
+        self,
+        calendar_id: str,
+        time_min: datetime,
+        time_max: datetime,
+        max_results: int,
+        single_events: bool = True,
+        order_by: str = 'startTime',
+        event_types: Optional[List[str]] = None
+    ) -> List[CalendarEvent]:
+        """Fetch and convert one page of events (uncached; raises on API errors)"""
+        events_result = self.service.events().list(
+            calendarId=calendar_id,
+            timeMin=_to_rfc3339(time_min),
+            timeMax=_to_rfc3339(time_max),
+            maxResults=max_results,
+            singleEvents=single_events,
+            orderBy=order_by,
+            showDeleted=False,
+            eventTypes=event_types,  # None is omitted from the request
+            fields=EVENT_LIST_FIELDS
+        ).execute()
+        
+        # Convert to CalendarEvent objects
+        return self._parse_events(events_result.get('items', []))
+    
+    def _report_events_error(self, error: Exception):
+        """Show a user-facing message for a failed events request"""
+        if isinstance(error, HttpError):
+            if error.resp.status == 403:
                 st.error(ERROR_MESSAGES["rate_limit"])
-            elif e.resp.status == 401:
+            elif error.resp.status == 401:
                 st.error(ERROR_MESSAGES["token_expired"])
                 if self.oauth_handler:
                     self.oauth_handler.logout()
             else:
-                st.error(f"API Error: {e}")
-            return []
-        except Exception as e:
-            st.error(f"Error fetching events: {e}")
-            return []
+                st.error(f"API Error: {error}")
+        else:
+            st.error(f"Error fetching events: {error}")
+    
+    def _parse_events(self, items: Iterable[Dict[str, Any]]) -> List[CalendarEvent]:
+        """
+        Convert raw Google Calendar event items to CalendarEvent objects
+        
+        Events that fail to convert are skipped and reported in a single warning.
+        """
+        calendar_events = []
+        errors = []
+        for event in items:
+            try:
+                calendar_events.append(CalendarEvent.from_google_calendar(event))
+            except Exception as e:
+                errors.append((event.get('summary', 'Unknown'), e))
+        
+        if errors:
+            summary, error = errors[0]
+            st.warning(f"Skipped {len(errors)} event(s) that could not be processed; first: '{summary}': {error}")
+        return calendar_events
+    
+    def _event_list_request(
+        self,
+        calendar_id: str,
+        time_min: datetime,
+        time_max: datetime,
+        page_size: int = 250
+    ):
+        """Build an events().list() request for a calendar and time range"""
+        return self.service.events().list(
+            calendarId=calendar_id,
+            timeMin=_to_rfc3339(time_min),
+            timeMax=_to_rfc3339(time_max),
+            maxResults=page_size,
+            singleEvents=True,
+            orderBy='startTime',
+            showDeleted=False,
+            fields=EVENT_LIST_FIELDS
+        )
+    
+    def _iter_event_pages(self, request, response: Optional[Dict[str, Any]] = None):
+        """
+        Yield raw event items page by page, following nextPageToken
+        
+        Args:
+            request: events().list() request for the first page
+            response: Already-fetched first page, if any
+        """
+        while request is not None:
+            if response is None:
+                response = request.execute()
+            yield from response.get('items', [])
+            request = self.service.events().list_next(request, response)
+            response = None
+    
+    def _fetch_first_pages(
+        self,
+        calendar_ids: List[str],
+        time_min: datetime,
+        time_max: datetime
+    ) -> List[tuple]:
+        """
+        Fetch the first page of events for each calendar
+        
+        Several calendars are fetched in one batched HTTP request.
+        
+        Returns:
+            List of (request, response) pairs for calendars that succeeded
+        """
+        requests = {
+            calendar_id: self._event_list_request(calendar_id, time_min, time_max)
+            for calendar_id in calendar_ids
+        }
+        
+        if len(requests) == 1:
+            request = next(iter(requests.values()))
+            return [(request, request.execute())]
+        
+        pages = []
+        
+        def _collect(request_id, response, exception):
+            if exception is not None:
+                st.warning(f"Error fetching events for calendar '{request_id}': {exception}")
+                return
+            pages.append((requests[request_id], response))
+        
+        batch = self.service.new_batch_http_request(callback=_collect)
+        for calendar_id, request in requests.items():
+            batch.add(request, request_id=calendar_id)
+        batch.execute()
+        
+        return pages
     
     def get_events_for_date_range(
         self,
@@ -177,6 +348,8 @@ class GoogleCalendarAPI:
         """
         Get events for a specific date range from multiple calendars
         
+        All pages are fetched, so busy calendars aren't truncated.
+        
         Args:
             start_date: Start date
             end_date: End date  
@@ -188,21 +361,26 @@ class GoogleCalendarAPI:
         if calendar_ids is None:
             calendar_ids = ['primary']
         
-        all_events = []
+        if not self.is_connected():
+            st.error("Not connected to Google Calendar")
+            return []
         
-        for calendar_id in calendar_ids:
-            events = self.get_events(
-                calendar_id=calendar_id,
-                time_min=start_date,
-                time_max=end_date,
-                max_results=250  # Higher limit for date range queries
-            )
-            all_events.extend(events)
+        per_calendar = []
         
-        # Sort events by start time
-        all_events.sort(key=lambda x: x.start_time)
+        try:
+            # One round-trip for the first page of every calendar, then follow-up pages
+            for request, response in self._fetch_first_pages(calendar_ids, start_date, end_date):
+                per_calendar.append(self._parse_events(self._iter_event_pages(request, response)))
+        except HttpError as e:
+            if e.resp.status == 403:
+                st.error(ERROR_MESSAGES["rate_limit"])
+            else:
+                st.error(f"API Error: {e}")
+        except Exception as e:
+            st.error(f"Error fetching events: {e}")
         
-        return all_events
+        # Each calendar's events arrive ordered by startTime, so merge instead of re-sorting
+        return list(heapq.merge(*per_calendar, key=lambda x: x.start_time))
     
     def get_today_events(self) -> List[CalendarEvent]:
         """Get today's events"""
@@ -215,16 +393,27 @@ class GoogleCalendarAPI:
             max_results=50
         )
     
-    def get_week_events(self) -> List[CalendarEvent]:
-        """Get this week's events"""
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        week_end = today + timedelta(days=7)
+    def get_week_events(self, now: Optional[datetime] = None) -> List[CalendarEvent]:
+        """Get this week's events (the week starting on the day of ``now``)"""
+        if not self.is_connected():
+            st.error("Not connected to Google Calendar")
+            return []
         
-        return self.get_events(
-            time_min=today,
-            time_max=week_end,
-            max_results=100
-        )
+        try:
+            return self._fetch_week_events(now or datetime.now())
+        except Exception as e:
+            self._report_events_error(e)
+            return []
+    
+    def _week_fetch_args(self, now: datetime) -> tuple:
+        """(time_min_iso, time_max_iso, max_results) identifying this week's cached events"""
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_end = today + timedelta(days=7)
+        return today.isoformat(), week_end.isoformat(), 100
+    
+    def _fetch_week_events(self, now: datetime) -> List[CalendarEvent]:
+        """This week's events through the per-user cache (raises on API errors)"""
+        return _fetch_events(self.cache_key, *self._week_fetch_args(now), self)
     
     def get_upcoming_events(self, limit: int = 10) -> List[CalendarEvent]:
         """Get upcoming events starting from now"""
@@ -237,6 +426,17 @@ class GoogleCalendarAPI:
             max_results=limit
         )
     
+    def get_focus_events_for_week(self) -> List[CalendarEvent]:
+        """Get this week's Google Focus Time blocks, filtered by the API"""
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        return self.get_events(
+            time_min=today,
+            time_max=today + timedelta(days=7),
+            max_results=100,
+            event_types=['focusTime']
+        )
+    
     def search_events(self, query: str, max_results: int = 25) -> List[CalendarEvent]:
         """
         Search for events containing specific text
@@ -258,26 +458,17 @@ class GoogleCalendarAPI:
             
             events_result = self.service.events().list(
                 calendarId='primary',
-                timeMin=time_min.isoformat() + 'Z',
-                timeMax=time_max.isoformat() + 'Z',
+                timeMin=_to_rfc3339(time_min),
+                timeMax=_to_rfc3339(time_max),
                 maxResults=max_results,
                 singleEvents=True,
                 orderBy='startTime',
-                q=query  # Search query
+                q=query,  # Search query
+                fields=EVENT_LIST_FIELDS
             ).execute()
             
-            events = events_result.get('items', [])
-            
             # Convert to CalendarEvent objects
-            calendar_events = []
-            for event in events:
-                try:
-                    calendar_event = CalendarEvent.from_google_calendar(event)
-                    calendar_events.append(calendar_event)
-                except Exception as e:
-                    continue
-            
-            return calendar_events
+            return self._parse_events(events_result.get('items', []))
             
         except Exception as e:
             st.error(f"Error searching events: {e}")
@@ -289,30 +480,37 @@ class GoogleCalendarAPI:
         
         Returns:
             Dictionary with sync summary
+        
+        Raises:
+            Exception: If the sync failed (already reported to the user), so
+                callers that cache the summary never store a failed sync
         """
         try:
+            if not self.is_connected():
+                raise RuntimeError("Not connected to Google Calendar")
+            
+            # One snapshot of "now" so the week window, today's count and sync_time agree
+            now = datetime.now()
+            
             # Get calendar list
-            calendars = self.get_calendars()
+            calendars = _fetch_calendars(self.cache_key, self)
             
             # Get events for the next week
-            events = self.get_week_events()
+            events = self._fetch_week_events(now)
             
-            # Calculate summary statistics
-            total_events = len(events)
-            total_meetings = len([e for e in events if e.is_meeting])
-            total_duration = sum(e.duration_minutes for e in events)
-            
-            today_events = [e for e in events if e.start_time.date() == datetime.now().date()]
+            # Calculate summary statistics from the events already fetched
+            stats = self.get_calendar_statistics(events=events, now=now)
             
             sync_summary = {
                 'calendars_count': len(calendars),
-                'total_events': total_events,
-                'total_meetings': total_meetings,
-                'total_duration_hours': round(total_duration / 60, 1),
-                'today_events': len(today_events),
-                'sync_time': datetime.now(),
+                'total_events': len(events),
+                'total_meetings': stats.get('total_meetings', 0),
+                'total_duration_hours': round(stats.get('total_duration_minutes', 0) / 60, 1),
+                'today_events': stats.get('events_today', 0),
+                'sync_time': now,
                 'events': events,
-                'calendars': calendars
+                'calendars': calendars,
+                'statistics': stats
             }
             
             # Store in session state
@@ -321,43 +519,64 @@ class GoogleCalendarAPI:
             st.success(SUCCESS_MESSAGES["sync_complete"])
             return sync_summary
             
+        except HttpError as e:
+            self._report_events_error(e)
+            raise
         except Exception as e:
             st.error(f"Error syncing calendar data: {e}")
-            return {}
+            raise
     
-    def get_calendar_statistics(self) -> Dict[str, Any]:
-        """Get calendar usage statistics"""
-        events = self.get_week_events()
+    def get_calendar_statistics(
+        self,
+        events: Optional[List[CalendarEvent]] = None,
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Get calendar usage statistics
         
-        if not events:
-            return {}
+        Args:
+            events: Already-fetched events to summarize (default: fetch this week's events)
+            now: Reference time for "today" (default: current time)
         
-        # Calculate various statistics
-        stats = {
-            'total_events': len(events),
-            'total_meetings': len([e for e in events if e.is_meeting]),
-            'total_focus_time': len([e for e in events if e.event_type == 'focus_time']),
-            'total_duration_minutes': sum(e.duration_minutes for e in events),
-            'average_event_duration': sum(e.duration_minutes for e in events) / len(events),
-            'longest_event_duration': max(e.duration_minutes for e in events),
-            'events_by_day': {},
-            'events_by_type': {},
-            'events_by_hour': {}
-        }
+        Returns:
+            Dictionary of statistics, empty if there are no events
+        """
+        now = now or datetime.now()
+        if events is None:
+            events = self.get_week_events(now=now)
         
-        # Group by day
-        for event in events:
-            day = event.start_time.strftime('%A')
-            stats['events_by_day'][day] = stats['events_by_day'].get(day, 0) + 1
+        if not events:
+            return {}
         
-        # Group by type
-        for event in events:
-            event_type = event.event_type
-            stats['events_by_type'][event_type] = stats['events_by_type'].get(event_type, 0) + 1
+        # Calculate all statistics in a single pass over the events
+        today = now.date()
+        meetings = events_today = duration_sum = duration_max = 0
+        by_day, by_type, by_hour = Counter(), Counter(), Counter()
         
-        # Group by hour
         for event in events:
-            hour = event.start_time.hour
-            stats['events_by_hour'][hour] = stats['events_by_hour'].get(hour, 0) + 1
+            duration = event.duration_minutes
+            duration_sum += duration
+            if duration > duration_max:
+                duration_max = duration
+            if event.is_meeting:
+                meetings += 1
+            
+            start_time = event.start_time
+            if start_time.date() == today:
+                events_today += 1
+            by_day[start_time.strftime('%A')] += 1
+            by_type[event.event_type] += 1
+            by_hour[start_time.hour] += 1
         
-        return stats
\ No newline at end of file
+        return {
+            'total_events': len(events),
+            'total_meetings': meetings,
+            'events_today': events_today,
+            'total_focus_time': by_type['focus_time'],
+            'total_duration_minutes': duration_sum,
+            'average_event_duration': duration_sum / len(events),
+            'longest_event_duration': duration_max,
+            'events_by_day': dict(by_day),
+            'events_by_type': dict(by_type),
+            'events_by_hour': dict(by_hour)
+        }
\ No newline at end of file
@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 
-@dataclass
+@dataclass(slots=True)
 class CalendarEvent:
     """
     Represents a calendar event with standardized fields
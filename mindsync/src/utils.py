@@ -0,0 +1,9 @@
+"""
+Shared helpers
+"""
+
+import hashlib
+
+def fast_digest(data: bytes) -> str:
+    """Short BLAKE2b hex digest for cache keys and signatures (not for passwords)"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()